@@ -0,0 +1,439 @@
+# /attachments/app/core/analytics.py
+# Snapshot colunar das OS para KPIs (MTTR, idade do backlog, taxa no prazo, produtividade).
+# Cada campo vira um array NumPy: datas em segundos (int64) e campos categóricos
+# (status, prioridade, usina, técnico) como códigos inteiros. O os_api mantém o
+# snapshot atualizado a cada escrita; as consultas são group-by vetorizados.
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # analytics é opcional: sem NumPy a rota responde 503
+    np = None
+
+DONE_STATUS = "Concluído"
+_NONE = -1
+_GROUP_KEYS = ("plant", "client", "technician", "status", "priority", "month")
+# Até este número de combinações de grupo a chave é indexada direto, sem ordenação
+_DENSE_MAX = 1 << 22
+
+
+def available() -> bool:
+    return np is not None
+
+
+class _Categories:
+    """Dicionário valor <-> código inteiro, só cresce."""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def code(self, value: Optional[str]) -> int:
+        if not value:
+            return _NONE
+        c = self.codes.get(value)
+        if c is None:
+            c = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return c
+
+    def label(self, code: int) -> Optional[str]:
+        return self.values[code] if code >= 0 else None
+
+
+def _ts(value: Optional[str]) -> int:
+    """
+    ISO 8601 ("2025-11-13T15:10:47.200Z") -> segundos desde a época (frações truncadas);
+    -1 se vazio/inválido. Sem fuso explícito vale UTC. É a referência de _ts_array.
+    """
+    if not value:
+        return _NONE
+    try:
+        d = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return _NONE
+    if d.tzinfo is None:
+        d = d.replace(tzinfo=timezone.utc)
+    return int(d.timestamp() // 1)
+
+
+def _completed_at(o: dict) -> int:
+    if o.get("status") != DONE_STATUS:
+        return _NONE
+    # Último log que levou a OS para "Concluído"; sem log, vale o updatedAt
+    for log in o.get("logs") or []:
+        change = log.get("statusChange") or {}
+        if change.get("to") == DONE_STATUS:
+            return _ts(log.get("timestamp"))
+    return _ts(o.get("updatedAt"))
+
+
+def _month(seconds: int) -> int:
+    # Meses desde 1970-01 (ex.: 2025-11 -> 670)
+    if seconds < 0:
+        return _NONE
+    d = datetime.utcfromtimestamp(seconds)
+    return (d.year - 1970) * 12 + d.month - 1
+
+
+def _utc_or_naive(v: str) -> bool:
+    # Depois de "YYYY-MM-DDTHH:MM:SS" só pode vir fração e/ou "Z" (sem offset +hh:mm/-hh:mm)
+    tail = v[19:]
+    return len(v) >= 19 and "+" not in tail and "-" not in tail
+
+def _ts_array(values: List[Optional[str]]):
+    """
+    Mesmo resultado de [_ts(v) for v in values], vetorizado pelo NumPy.
+    Datas UTC/sem fuso vão direto para datetime64; com offset explícito (ou
+    se o NumPy recusar alguma) o valor passa por _ts.
+    """
+    fast = [v[:19] if v and _utc_or_naive(v) else "NaT" for v in values]
+    try:
+        arr = np.array(fast, dtype="datetime64[s]")
+    except ValueError:
+        return np.array([_ts(v) for v in values], dtype=np.int64)
+    out = arr.astype(np.int64)
+    out[np.isnat(arr)] = _NONE
+    for i, v in enumerate(values):
+        if v and fast[i] == "NaT":
+            out[i] = _ts(v)
+    return out
+
+
+def _month_array(seconds):
+    months = seconds.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+    return np.where(seconds >= 0, months, _NONE)
+
+
+_NEVER = 2**63 - 1  # int64 máximo: "sem valor" em colunas usadas para mínimo
+
+
+class OSColumns:
+    # nome -> (dtype, valor vazio). As colunas a partir de "done" são derivadas
+    # das datas (ver _derive) e existem para a consulta não refazer esse cálculo
+    # sobre todas as linhas a cada chamada.
+    _SPEC = {
+        "created": ("int64", _NONE),
+        "start": ("int64", _NONE),
+        "completed": ("int64", _NONE),
+        "status": ("int32", _NONE),
+        "priority": ("int32", _NONE),
+        "plant": ("int32", _NONE),
+        "technician": ("int32", _NONE),
+        "month": ("int32", _NONE),
+        "done": ("float64", 0),          # 1.0 se concluída
+        "open": ("float64", 0),          # 1.0 se aberta com createdAt
+        "repair": ("float64", 0),        # conclusão - abertura (s)
+        "openCreated": ("float64", 0),   # createdAt das abertas
+        "openMin": ("int64", _NEVER),    # idem, p/ mínimo por grupo
+        "lateness": ("int64", _NEVER),   # conclusão - startDate (s)
+    }
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.rows: Dict[str, int] = {}
+        self.status = _Categories()
+        self.priority = _Categories()
+        self.plant = _Categories()
+        self.technician = _Categories()
+        self.cols = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        old = self.cols
+        self.cols = {}
+        for name, (dtype, empty) in self._SPEC.items():
+            arr = np.full(capacity, empty, dtype=dtype)
+            if name in old:
+                arr[: self.size] = old[name][: self.size]
+            self.cols[name] = arr
+
+    def _derive(self, rows):
+        """Recalcula as colunas derivadas das linhas 'rows' (fatia ou array de índices)."""
+        c = self.cols
+        created, start, completed = c["created"][rows], c["start"][rows], c["completed"][rows]
+        done = completed >= 0
+        has_created = created >= 0
+        is_open = ~done & has_created
+        c["done"][rows] = done
+        c["open"][rows] = is_open
+        c["repair"][rows] = np.where(done & has_created, completed - created, 0)
+        c["openCreated"][rows] = np.where(is_open, created, 0)
+        c["openMin"][rows] = np.where(is_open, created, _NEVER)
+        c["lateness"][rows] = np.where(done & (start >= 0), completed - start, _NEVER)
+
+    def upsert(self, records: List[dict]):
+        """Insere ou substitui linhas pelo id da OS (atualização incremental)."""
+        needed = self.size + sum(1 for o in records if o["id"] not in self.rows)
+        capacity = len(self.cols["created"])
+        if needed > capacity:
+            while capacity < needed:
+                capacity *= 2
+            self._allocate(capacity)
+
+        c = self.cols
+        touched = []
+        for o in records:
+            row = self.rows.get(o["id"])
+            if row is None:
+                row = self.rows[o["id"]] = self.size
+                self.size += 1
+            created = _ts(o.get("createdAt"))
+            c["created"][row] = created
+            c["start"][row] = _ts(o.get("startDate"))
+            c["completed"][row] = _completed_at(o)
+            c["status"][row] = self.status.code(o.get("status"))
+            c["priority"][row] = self.priority.code(o.get("priority"))
+            c["plant"][row] = self.plant.code(o.get("plantId"))
+            c["technician"][row] = self.technician.code(o.get("technicianId"))
+            c["month"][row] = _month(created)
+            touched.append(row)
+        self._derive(np.array(touched, dtype=np.int64))
+
+    def load(self, records: List[dict]):
+        """Carga em massa de um snapshot vazio: datas convertidas de forma vetorizada."""
+        n = len(records)
+        self.rows = {o["id"]: i for i, o in enumerate(records)}
+        if len(self.rows) != n:
+            # ids repetidos no arquivo: o caminho linha a linha resolve (última vence)
+            self.rows = {}
+            return self.upsert(records)
+        if n > len(self.cols["created"]):
+            self._allocate(n)
+        self.size = n
+        c = self.cols
+        created = _ts_array([o.get("createdAt") for o in records])
+        c["created"][:n] = created
+        c["start"][:n] = _ts_array([o.get("startDate") for o in records])
+        c["completed"][:n] = [_completed_at(o) for o in records]
+        for name, cat, field in (
+            ("status", self.status, "status"),
+            ("priority", self.priority, "priority"),
+            ("plant", self.plant, "plantId"),
+            ("technician", self.technician, "technicianId"),
+        ):
+            c[name][:n] = [cat.code(o.get(field)) for o in records]
+        c["month"][:n] = _month_array(created)
+        self._derive(slice(0, n))
+
+    def view(self, name: str):
+        return self.cols[name][: self.size]
+
+
+_snapshot: Optional[OSColumns] = None
+
+
+def build(records: List[dict]) -> Optional[OSColumns]:
+    """Monta um snapshot novo sem publicá-lo (pode rodar fora do event loop)."""
+    if np is None:
+        return None
+    cols = OSColumns(max(1024, len(records)))
+    cols.load(records)
+    return cols
+
+
+def install(cols: Optional[OSColumns]):
+    """Publica um snapshot montado por build()."""
+    global _snapshot
+    _snapshot = cols
+
+
+def reset(records: List[dict]):
+    """Reconstrói o snapshot inteiro (carga inicial ou os.json alterado por fora)."""
+    install(build(records))
+
+
+def upsert(records: List[dict]):
+    if np is None or _snapshot is None:
+        return
+    _snapshot.upsert(records)
+
+
+def snapshot() -> Optional[OSColumns]:
+    return _snapshot
+
+
+def query_columns(
+    cols: OSColumns,
+    group_by: List[str],
+    plant_clients: Dict[str, str],
+    now: int,
+    sla_days: float = 7.0,
+    date_from: Optional[int] = None,
+    date_to: Optional[int] = None,
+    plant_ids: Optional[List[str]] = None,
+    clients: Optional[List[str]] = None,
+    technician_ids: Optional[List[str]] = None,
+) -> Dict[str, list]:
+    """
+    KPIs agrupados por qualquer combinação de plant/client/technician/status/priority/month
+    (month = mês de abertura da OS); group_by vazio = um grupo só, com os totais gerais.
+    Métricas por grupo:
+      total, open, completed (= produtividade), mttrHours (abertura -> conclusão),
+      backlogAgeDaysAvg/Max (OS abertas, até 'now'),
+      onTimeRate (concluídas até startDate + sla_days, entre as concluídas).
+    Retorno colunar: {nome da coluna: lista de valores, um por grupo}.
+    """
+    for g in group_by:
+        if g not in _GROUP_KEYS:
+            raise ValueError(f"invalid groupBy: {g}")
+
+    created = cols.view("created")
+    plant = cols.view("plant")
+
+    # Cliente derivado da usina na hora da consulta (a usina pode mudar de cliente).
+    # A coluna só é montada quando agrupa ou filtra por cliente.
+    client_cat = _Categories()
+    plant_to_client = np.array(
+        [_NONE] + [client_cat.code(plant_clients.get(p)) for p in cols.plant.values],
+        dtype=np.int32,
+    )
+    client = None
+    if "client" in group_by or clients:
+        client = plant_to_client[plant + 1]
+
+    codes = {
+        "plant": plant,
+        "client": client,
+        "technician": cols.view("technician"),
+        "status": cols.view("status"),
+        "priority": cols.view("priority"),
+        "month": cols.view("month"),
+    }
+    labels = {
+        "plant": cols.plant.values,
+        "client": client_cat.values,
+        "technician": cols.technician.values,
+        "status": cols.status.values,
+        "priority": cols.priority.values,
+        "month": None,
+    }
+
+    # Sem filtros, 'idx' é uma fatia (view) e evita copiar todas as colunas
+    mask = None
+    if date_from is not None:
+        mask = _and(mask, created >= date_from)
+    if date_to is not None:
+        mask = _and(mask, created < date_to)
+    for key, cat, wanted in (
+        ("plant", cols.plant, plant_ids),
+        ("client", client_cat, clients),
+        ("technician", cols.technician, technician_ids),
+    ):
+        if wanted:
+            wanted_codes = [cat.codes[w] for w in wanted if w in cat.codes]
+            mask = _and(mask, np.isin(codes[key], wanted_codes))
+
+    idx = slice(None) if mask is None else np.flatnonzero(mask)
+    size = cols.size if mask is None else idx.size
+    if size == 0:
+        return {}
+
+    # Chave composta em base mista: cada dimensão ocupa (máx. - mín. + 1) posições.
+    # Descontar o mínimo importa para o mês (códigos ~600+ desde 1970).
+    key = None
+    radices = []
+    offsets = []
+    for g in group_by:
+        col = codes[g][idx]
+        lo = int(col.min())
+        r = int(col.max()) - lo + 1
+        offsets.append(lo)
+        radices.append(r)
+        # Operações in-place: evita um temporário de 1M posições por passo
+        if key is None:
+            key = col.astype(np.int64)
+        else:
+            key *= r
+            key += col
+        key -= lo
+    if key is None:
+        # Sem groupBy: um único grupo com os totais gerais
+        key = np.zeros(size, dtype=np.int64)
+    span = 1
+    for r in radices:
+        span *= r
+    if span <= _DENSE_MAX:
+        # Poucas combinações possíveis: a própria chave serve de índice (sem ordenar)
+        present = np.bincount(key, minlength=span) > 0
+        uniq = np.flatnonzero(present)
+        remap = np.cumsum(present) - 1
+        inverse = remap[key]
+    else:
+        uniq, inverse = np.unique(key, return_inverse=True)
+    n = uniq.size
+
+    # Colunas derivadas já prontas no snapshot: aqui só somas/mínimos por grupo
+    done = cols.view("done")[idx]
+    on_time = cols.view("lateness")[idx] <= int(sla_days * 86400)
+
+    total = np.bincount(inverse, minlength=n)
+    n_done = np.bincount(inverse, weights=done, minlength=n)
+    n_open = total - n_done
+    repair_sum = np.bincount(inverse, weights=cols.view("repair")[idx], minlength=n)
+    # Soma de (now - createdAt) nas abertas = now * qtd - soma dos createdAt
+    age_sum = (
+        now * np.bincount(inverse, weights=cols.view("open")[idx], minlength=n)
+        - np.bincount(inverse, weights=cols.view("openCreated")[idx], minlength=n)
+    )
+    # Contar só as posições no prazo sai mais barato que pesos booleanos (convertidos p/ float)
+    on_time_sum = np.bincount(inverse[on_time], minlength=n)
+    oldest = np.full(n, _NEVER, dtype=np.int64)
+    np.minimum.at(oldest, inverse, cols.view("openMin")[idx])
+    age_max = np.where(oldest != _NEVER, now - oldest, 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mttr_h = np.round(repair_sum / n_done / 3600, 2)
+        age_d = np.round(age_sum / n_open / 86400, 2)
+        age_max_d = np.where(n_open > 0, np.round(age_max / 86400, 2), np.nan)
+        on_time_rate = np.round(on_time_sum / n_done, 4)
+
+    # Decompõe a chave composta de volta nos códigos de cada dimensão
+    columns = {}
+    rest = uniq.copy()
+    for g, r, lo in reversed(list(zip(group_by, radices, offsets))):
+        columns[g] = _labels(rest % r + lo, labels[g])
+        rest //= r
+
+    def _num(arr):
+        # NaN -> None (null no JSON); só as posições NaN passam por Python
+        out = arr.tolist()
+        for i in np.flatnonzero(np.isnan(arr)).tolist():
+            out[i] = None
+        return out
+
+    columns.update(
+        total=total.tolist(),
+        open=n_open.astype(np.int64).tolist(),
+        completed=n_done.astype(np.int64).tolist(),
+        mttrHours=_num(mttr_h),
+        backlogAgeDaysAvg=_num(age_d),
+        backlogAgeDaysMax=_num(age_max_d),
+        onTimeRate=_num(on_time_rate),
+    )
+    names = list(group_by) + [k for k in columns if k not in group_by]
+    return {k: columns[k] for k in names}
+
+
+def query(cols: OSColumns, group_by: List[str], plant_clients: Dict[str, str], now: int, **filters) -> List[dict]:
+    """Mesmo que query_columns, mas uma linha (dict) por grupo."""
+    columns = query_columns(cols, group_by, plant_clients, now, **filters)
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def _and(mask, cond):
+    return cond if mask is None else mask & cond
+
+
+def _labels(codes, values) -> list:
+    """Códigos -> rótulos por tabela (código -1 = sem valor -> None)."""
+    if values is None:
+        # Mês: tabela só do intervalo de meses presente no resultado
+        lo, hi = int(codes.min()), int(codes.max())
+        months = range(max(lo, 0), hi + 1)
+        table = [None] * (max(lo, 0) - lo) + [f"{1970 + m // 12}-{m % 12 + 1:02d}" for m in months]
+        return np.array(table, dtype=object)[codes - lo].tolist()
+    return np.array([None] + list(values), dtype=object)[codes + 1].tolist()
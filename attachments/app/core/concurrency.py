@@ -0,0 +1,35 @@
+# /attachments/app/core/concurrency.py
+# Controle de concorrência otimista: cada registro tem um campo "version"
+# exposto como ETag; PUT com If-Match desatualizado recebe 412 com o registro atual.
+
+from typing import Optional
+from fastapi import HTTPException
+
+def get_version(record: dict) -> int:
+    return int(record.get("version") or 0)
+
+def etag(record: dict) -> str:
+    return f'"{get_version(record)}"'
+
+def check_if_match(if_match: Optional[str], current: dict):
+    """
+    Valida o cabeçalho If-Match contra a versão atual do registro.
+    Sem cabeçalho a escrita é aceita (compatível com clientes antigos).
+    """
+    if not if_match:
+        return
+    tags = [t.strip() for t in if_match.split(",")]
+    if "*" in tags:
+        return
+    # Comparação fraca: W/"3" e "3" representam a mesma versão
+    tags = [t[2:] if t.startswith("W/") else t for t in tags]
+    if etag(current) not in tags:
+        raise HTTPException(
+            status_code=412,
+            detail=current,
+            headers={"ETag": etag(current)},
+        )
+
+def bump(record: dict, current: dict) -> dict:
+    """Retorna o registro com a versão seguinte à do registro atual."""
+    return {**record, "version": get_version(current) + 1}
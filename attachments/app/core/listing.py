@@ -0,0 +1,73 @@
+# /attachments/app/core/listing.py
+# Projeção de campos (fields=), busca em lote (ids=) e paginação (limit/cursor)
+# compartilhadas pelas rotas de listagem.
+
+import base64
+import binascii
+from typing import Iterable, List, Optional, Tuple, Type
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+def csv_param(value: Optional[str]) -> List[str]:
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """
+    Lista de campos pedidos, ou None se não houve projeção.
+    Só campos do schema de saída são aceitos (ex.: a senha nunca sai por aqui).
+    O id sempre acompanha, para o cliente conseguir identificar o registro.
+    """
+    wanted = csv_param(fields)
+    if not wanted:
+        return None
+    allowed = set(allowed)
+    unknown = [f for f in wanted if f not in allowed]
+    if unknown:
+        raise HTTPException(422, f"unknown fields: {', '.join(unknown)}")
+    return ["id"] + [f for f in wanted if f != "id"]
+
+def filter_ids(items: List[dict], ids: Optional[str]) -> List[dict]:
+    wanted = set(csv_param(ids))
+    if not wanted:
+        return items
+    return [it for it in items if it.get("id") in wanted]
+
+def _encode_cursor(last_id: str) -> str:
+    return base64.urlsafe_b64encode(last_id.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str) -> str:
+    try:
+        return base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(422, "invalid cursor")
+
+def paginate(items: List[dict], limit: Optional[int], cursor: Optional[str]) -> Tuple[List[dict], Optional[str]]:
+    """
+    Paginação por keyset: com limit/cursor a lista sai ordenada por id e o cursor
+    (opaco) guarda o último id devolvido; a próxima página começa no primeiro id
+    maior que ele. Inserções e remoções entre páginas não duplicam nem pulam
+    registros, mesmo se o próprio id do cursor tiver sido apagado.
+    Sem limit nem cursor, devolve a lista inteira na ordem original.
+    Retorna (página, próximo cursor ou None na última página).
+    """
+    if limit is None and not cursor:
+        return items, None
+    ordered = sorted(items, key=lambda it: str(it.get("id")))
+    if cursor:
+        last_id = _decode_cursor(cursor)
+        ordered = [it for it in ordered if str(it.get("id")) > last_id]
+    if limit is None or len(ordered) <= limit:
+        return ordered, None
+    page = ordered[:limit]
+    return page, _encode_cursor(str(page[-1].get("id")))
+
+def project(items: List[dict], fields: List[str], model: Type[BaseModel]) -> List[dict]:
+    """
+    Mantém só os campos pedidos. Campo ausente no registro recebe o default do schema
+    de saída (ex.: version 0, plantIds []), igual à resposta completa validada pelo modelo.
+    """
+    defaults = {}
+    for f in fields:
+        info = model.model_fields[f]
+        defaults[f] = None if info.is_required() else info.get_default(call_default_factory=True)
+    return [{f: it[f] if f in it else defaults[f] for f in fields} for it in items]
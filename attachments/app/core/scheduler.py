@@ -0,0 +1,152 @@
+# /attachments/app/core/scheduler.py
+# Geração de OS preventivas a partir de agendamentos recorrentes.
+# Só lógica pura (datas, seleção de usinas/ativos, responsáveis); a leitura e a
+# gravação em disco ficam em app/routes/schedules.py.
+
+import calendar
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterator, List, Optional
+
+_ROLE_TO_ASSIGNMENT = {
+    "Técnico": "technicianIds",
+    "Auxiliar": "assistantIds",
+    "Supervisor": "supervisorIds",
+}
+
+def _add_months(d: date, months: int, day: int) -> date:
+    y, m = divmod(d.month - 1 + months, 12)
+    y, m = d.year + y, m + 1
+    # Dia 31 em mês de 30 dias (ou fevereiro) cai no último dia do mês
+    return date(y, m, min(day, calendar.monthrange(y, m)[1]))
+
+def occurrences(recurrence: dict, after: Optional[date], until: date) -> Iterator[date]:
+    """Datas da recorrência no intervalo (after, until]."""
+    start = date.fromisoformat(recurrence["startDate"][:10])
+    end = recurrence.get("endDate")
+    if end:
+        until = min(until, date.fromisoformat(end[:10]))
+    freq, step = recurrence.get("freq", "monthly"), int(recurrence.get("interval") or 1)
+
+    if freq in ("daily", "weekly"):
+        days = step * (7 if freq == "weekly" else 1)
+        k = 0
+        if after and after >= start:
+            # Pula direto para a primeira ocorrência depois de 'after'
+            k = (after - start).days // days + 1
+        d = start + timedelta(days=days * k)
+        while d <= until:
+            yield d
+            k += 1
+            d = start + timedelta(days=days * k)
+        return
+
+    months = step * (12 if freq == "yearly" else 1)
+    k = 0
+    if after and after >= start:
+        k = max(0, ((after.year - start.year) * 12 + after.month - start.month) // months - 1)
+    d = _add_months(start, months * k, start.day)
+    while d <= until:
+        if after is None or d > after:
+            yield d
+        k += 1
+        d = _add_months(start, months * k, start.day)
+
+def occurrence_index(recurrence: dict, day: date) -> int:
+    """Posição de 'day' na recorrência (0 = startDate); estável entre execuções."""
+    start = date.fromisoformat(recurrence["startDate"][:10])
+    freq, step = recurrence.get("freq", "monthly"), int(recurrence.get("interval") or 1)
+    if freq in ("daily", "weekly"):
+        return (day - start).days // (step * (7 if freq == "weekly" else 1))
+    months = step * (12 if freq == "yearly" else 1)
+    return ((day.year - start.year) * 12 + day.month - start.month) // months
+
+def select_plants(schedule: dict, plants: List[dict]) -> List[dict]:
+    ids, clients = set(schedule.get("plantIds") or []), set(schedule.get("clients") or [])
+    if not ids and not clients:
+        return plants
+    return [p for p in plants if p["id"] in ids or p.get("client") in clients]
+
+def select_assets(schedule: dict, plant: dict) -> List[List[str]]:
+    """Grupos de ativos: cada grupo vira uma OS."""
+    wanted = schedule.get("assets") or []
+    if not wanted:
+        return [[]]
+    present = set(plant.get("assets") or [])
+    matched = [a for a in wanted if a in present]
+    if not matched:
+        return []
+    if schedule.get("perAsset", True):
+        return [[a] for a in matched]
+    return [matched]
+
+def schedule_key(schedule_id: str, plant_id: str, assets: List[str], day: date) -> str:
+    return f"{schedule_id}:{plant_id}:{'|'.join(assets)}:{day.isoformat()}"
+
+def generate(
+    schedules: List[dict],
+    plants: List[dict],
+    assignments_for: Callable[[str], dict],
+    existing_keys: set,
+    until: date,
+) -> Dict[str, object]:
+    """
+    Monta as OS vencidas até 'until' para todos os agendamentos ativos.
+    Retorna {"items": [dict de OS], "generatedThrough": {scheduleId: data}}.
+    'assignments_for' é chamado no máximo uma vez por usina.
+    """
+    items = []
+    watermarks = {}
+    assignments_cache: Dict[str, dict] = {}
+
+    for s in schedules:
+        if not s.get("active", True):
+            continue
+        last = s.get("generatedThrough")
+        after = date.fromisoformat(last) if last else None
+        try:
+            days = list(occurrences(s["recurrence"], after, until))
+        except (KeyError, ValueError) as e:
+            # Agendamento gravado com recorrência inválida: pula só ele
+            print(f"⚠️ [SCHEDULER] Agendamento {s['id']} ignorado: {e}")
+            continue
+        # A marca só avança: rodar com um 'until' anterior não a faz voltar
+        watermarks[s["id"]] = max(after, until).isoformat() if after else until.isoformat()
+        if not days:
+            continue
+        field = _ROLE_TO_ASSIGNMENT.get(s.get("assigneeRole", "Técnico"), "technicianIds")
+
+        for plant in select_plants(s, plants):
+            groups = select_assets(s, plant)
+            if not groups:
+                continue
+            pid = plant["id"]
+            if pid not in assignments_cache:
+                assignments_cache[pid] = assignments_for(pid)
+            a = assignments_cache[pid]
+            assignees = a.get(field) or []
+            supervisors = a.get("supervisorIds") or []
+
+            for day in days:
+                n = occurrence_index(s["recurrence"], day)
+                for g, assets in enumerate(groups):
+                    key = schedule_key(s["id"], pid, assets, day)
+                    if key in existing_keys:
+                        continue
+                    existing_keys.add(key)
+                    # Rodízio entre os responsáveis da usina: dentro da ocorrência cada grupo
+                    # pega o próximo, e a cada ocorrência o início avança um. Como 'n' conta
+                    # desde o startDate, o rodízio continua de uma execução para a outra.
+                    k = n + g
+                    items.append({
+                        "description": s.get("description") or s["activity"],
+                        "status": "Pendente",
+                        "priority": s.get("priority") or "Média",
+                        "plantId": pid,
+                        "technicianId": assignees[k % len(assignees)] if assignees else None,
+                        "supervisorId": supervisors[k % len(supervisors)] if supervisors else None,
+                        "startDate": f"{day.isoformat()}T00:00:00.000Z",
+                        "activity": s["activity"],
+                        "assets": assets,
+                        "scheduleKey": key,
+                    })
+    return {"items": items, "generatedThrough": watermarks}
@@ -1,6 +1,7 @@
 # /attachments/app/core/schemas.py
 from typing import List, Optional, Literal
-from pydantic import BaseModel, Field
+from datetime import date
+from pydantic import BaseModel, Field, field_validator
 
 # -------------------- USERS --------------------
 RoleLiteral = Literal["Admin","Coordenador","Supervisor","Operador","Técnico","Auxiliar"]
@@ -37,6 +38,7 @@ class UserOut(UserBase):
     # Senha removida por segurança (Use /api/login para autenticar)
     # password: Optional[str] = None 
     plantIds: List[str] = []
+    version: int = 0
 
 
 # -------------------- PLANTS --------------------
@@ -68,8 +70,56 @@ class PlantUpdate(PlantBase, AssignmentsMixin):
 
 class PlantOut(PlantBase, AssignmentsMixin):
     id: str
+    version: int = 0
 
 
 # -------------------- ASSIGNMENTS PAYLOAD (Mantido para compatibilidade) --------------------
 class AssignmentsPayload(AssignmentsMixin):
-    pass
\ No newline at end of file
+    pass
+
+
+# -------------------- SCHEDULES (MANUTENÇÃO PREVENTIVA) --------------------
+class RecurrenceOut(BaseModel):
+    freq: Literal["daily","weekly","monthly","yearly"] = "monthly"
+    interval: int = Field(1, ge=1)          # ex.: semestral = monthly, interval 6
+    startDate: str                          # primeira ocorrência, "YYYY-MM-DD"
+    endDate: Optional[str] = None
+
+class Recurrence(RecurrenceOut):
+    # Validação só na entrada: agendamentos antigos com data ruim continuam listáveis
+    @field_validator("startDate", "endDate")
+    @classmethod
+    def _iso_date(cls, v: Optional[str]) -> Optional[str]:
+        # Data inválida vira 422 no cadastro, em vez de quebrar a geração depois
+        if v is None:
+            return v
+        try:
+            return date.fromisoformat(v[:10]).isoformat()
+        except ValueError:
+            raise ValueError("must be a date in YYYY-MM-DD format")
+
+class ScheduleBase(BaseModel):
+    activity: str                           # ex.: "Inspeção semestral"
+    description: str = ""
+    priority: str = "Média"
+    # Seletor: usinas explícitas e/ou clientes; ambos vazios = todas as usinas
+    plantIds: List[str] = Field(default_factory=list)
+    clients: List[str] = Field(default_factory=list)
+    # Ativos: vazio = uma OS por usina sem ativo; senão cruza com os ativos da usina
+    assets: List[str] = Field(default_factory=list)
+    perAsset: bool = True                   # uma OS por ativo (True) ou uma por usina (False)
+    recurrence: Recurrence
+    assigneeRole: Literal["Técnico","Auxiliar","Supervisor"] = "Técnico"
+    active: bool = True
+
+class ScheduleCreate(ScheduleBase):
+    pass
+
+class ScheduleUpdate(ScheduleBase):
+    pass
+
+class ScheduleOut(ScheduleBase):
+    id: str
+    recurrence: RecurrenceOut
+    # Ocorrências até esta data (inclusive) já foram geradas
+    generatedThrough: Optional[str] = None
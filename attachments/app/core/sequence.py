@@ -0,0 +1,25 @@
+# /attachments/app/core/sequence.py
+# Sequências numéricas duráveis (ex.: números de OS), gravadas em data/sequences.json.
+# Cada reserva só retorna depois que o novo valor foi salvo em disco,
+# então um número entregue nunca é reutilizado após um restart.
+
+import asyncio
+from app.core.storage import load, save
+
+_SEQ_FILE = "sequences.json"
+_lock = asyncio.Lock()
+
+async def reserve(name: str, count: int = 1, floor: int = 0) -> range:
+    """
+    Reserva `count` valores consecutivos da sequência `name`.
+    `floor` garante que a sequência comece acima de valores já usados
+    (útil na primeira reserva, quando já existem registros numerados).
+    """
+    if count < 1:
+        raise ValueError("count must be >= 1")
+    async with _lock:
+        seqs = await load(_SEQ_FILE, {})
+        start = max(int(seqs.get(name, 0)), floor) + 1
+        seqs[name] = start + count - 1
+        await save(_SEQ_FILE, seqs)
+    return range(start, start + count)
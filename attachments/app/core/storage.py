@@ -3,67 +3,196 @@
 # Os arquivos são salvos em /attachments/data para facilitar backup e migração.
 
 # Persistência em JSON com lock thread-safe e retry automático para Windows/Nextcloud
+import asyncio
+import gc
 import json
+import os
 import threading
 import time
-from typing import Any
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # opcional: sem orjson a leitura usa o json da stdlib (mais lenta)
+    orjson = None
+
 _LOCKS = {}
+_LOCKS_GUARD = threading.Lock()
 
 # Define o diretório de dados
 _BASE_DIR = Path(__file__).resolve().parents[2] / "data"
 _BASE_DIR.mkdir(parents=True, exist_ok=True)
 
+# Executor dedicado para I/O de disco. Fica separado do threadpool padrão do
+# Starlette para que uma escrita lenta no Nextcloud não trave rotas como /api/health.
+_IO_WORKERS = int(os.getenv("LOOPOS_IO_WORKERS", "4"))
+_IO_QUEUE_MAX = int(os.getenv("LOOPOS_IO_QUEUE_MAX", "64"))
+_IO_EXECUTOR = ThreadPoolExecutor(max_workers=_IO_WORKERS, thread_name_prefix="loopos-io")
+_IO_SLOTS = asyncio.Semaphore(_IO_QUEUE_MAX)
+
+_STATS_LOCK = threading.Lock()
+_STATS = {
+    # waiting: aguardando vaga na fila (_IO_QUEUE_MAX cheia); queued: na fila do executor
+    "waiting": 0,
+    "queued": 0,
+    "running": 0,
+    "completed": 0,
+    "failed": 0,
+    "maxWaitMs": 0.0,
+}
+
+# Geração de cada arquivo: save() assíncrono pode ter várias escritas do mesmo
+# arquivo na fila; só a mais recente (maior geração) chega ao disco.
+_GEN_REQUESTED = {}
+_GEN_WRITTEN = {}
+_IN_FLIGHT = {}
+
 def _get_lock(name: str) -> threading.Lock:
-    if name not in _LOCKS:
-        _LOCKS[name] = threading.Lock()
-    return _LOCKS[name]
+    with _LOCKS_GUARD:
+        if name not in _LOCKS:
+            _LOCKS[name] = threading.Lock()
+        return _LOCKS[name]
 
 def _path(name: str) -> Path:
     return _BASE_DIR / name
 
+# Formato de escrita: "json" (indentado, legível; o frontend também lê /data/*.json)
+# ou "snapshot" (JSON compacto com cabeçalho de tamanho + CRC32). A leitura detecta
+# o formato sozinha, então dá para trocar a variável sem migrar os arquivos.
+STORAGE_FORMAT = os.getenv("LOOPOS_STORAGE_FORMAT", "json")
+_SNAPSHOT_MAGIC = b"LOOPOS1 "
+
+# Assinatura (mtime, tamanho) da última versão que sabemos estar íntegra de cada arquivo.
+# Só uma versão íntegra é promovida a .bak ao salvar.
+_KNOWN_GOOD = {}
+
+class StorageCorruptedError(RuntimeError):
+    """Arquivo de dados corrompido/truncado e sem geração anterior íntegra para usar."""
+
+def _backup_path(p: Path) -> Path:
+    return p.with_suffix(p.suffix + ".bak")
+
+def encode_snapshot(data: Any) -> bytes:
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    header = _SNAPSHOT_MAGIC + f"{len(body)} {zlib.crc32(body):08x}\n".encode("ascii")
+    return header + body
+
+def encode_json(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+def _loads(raw: bytes) -> Any:
+    """
+    json.loads mais rápido para arquivos grandes: usa orjson se instalado e pausa o GC
+    enquanto os dicts são criados (senão ele roda dezenas de coletas inúteis no meio).
+    """
+    paused = gc.isenabled()
+    if paused:
+        gc.disable()
+    try:
+        if orjson is not None:
+            try:
+                return orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                # orjson é mais estrito (ex.: NaN que o json.dumps aceita gravar): confirma no json
+                pass
+        return json.loads(raw)
+    finally:
+        if paused:
+            gc.enable()
+
+def decode(raw: bytes) -> Any:
+    """Decodifica qualquer um dos dois formatos; levanta ValueError se truncado/corrompido."""
+    if not raw:
+        raise ValueError("arquivo vazio (0 bytes)")
+    if raw.startswith(_SNAPSHOT_MAGIC):
+        nl = raw.find(b"\n")
+        if nl < 0:
+            raise ValueError("cabeçalho do snapshot incompleto")
+        try:
+            length, crc = raw[len(_SNAPSHOT_MAGIC):nl].split()
+            length, crc = int(length), int(crc, 16)
+        except ValueError:
+            raise ValueError("cabeçalho do snapshot inválido")
+        body = raw[nl + 1:]
+        if len(body) != length:
+            raise ValueError(f"snapshot truncado: {len(body)} de {length} bytes")
+        if zlib.crc32(body) != crc:
+            raise ValueError("CRC do snapshot não confere")
+        return _loads(body)
+    # json.JSONDecodeError (e o orjson.JSONDecodeError) já é subclasse de ValueError
+    return _loads(raw)
+
+def _read(p: Path) -> Any:
+    with p.open("rb") as f:
+        return decode(f.read())
+
 def load_json(name: str, default: Any):
     """
-    Carrega um arquivo JSON com segurança.
-    Se der erro, retorna o valor 'default' (geralmente uma lista vazia []).
+    Carrega um arquivo de dados (JSON ou snapshot).
+    Arquivo inexistente retorna 'default' (geralmente uma lista vazia []).
+    Arquivo vazio, truncado ou corrompido NÃO vira 'default': cai na geração
+    anterior (.bak) e, se ela também não servir, levanta StorageCorruptedError.
     """
     p = _path(name)
+    bak = _backup_path(p)
     
-    # Se arquivo não existe, retorna default
-    if not p.exists():
-        return default
-    
-    # Se arquivo está vazio (0 bytes), retorna default
-    if p.stat().st_size == 0:
-        print(f"⚠️ [STORAGE] Arquivo vazio detectado: {name}")
-        return default
-    
-    try:
-        with p.open("r", encoding="utf-8") as f:
-            data = json.load(f)
+    if p.exists():
+        try:
+            sig = file_signature(name)
+            data = _read(p)
+            _KNOWN_GOOD[name] = sig
             # Se o JSON for "null", retorna default
-            if data is None:
-                return default
-            return data
-    except json.JSONDecodeError as e:
-        print(f"❌ [STORAGE] JSON corrompido em {name}: {e}")
-        return default
-    except Exception as e:
-        print(f"❌ [STORAGE] Erro ao ler {name}: {e}")
+            return default if data is None else data
+        except ValueError as e:
+            print(f"❌ [STORAGE] {name} corrompido: {e}")
+            error = e
+    elif not bak.exists():
+        # Se arquivo não existe, retorna default
         return default
+    else:
+        # Queda entre as duas trocas de nome do save: o .bak é a última versão boa
+        error = FileNotFoundError(name)
+
+    try:
+        data = _read(bak)
+    except (OSError, ValueError) as e:
+        raise StorageCorruptedError(f"{name}: {error}; backup inutilizável: {e}") from error
+    print(f"⚠️ [STORAGE] Usando a geração anterior de {name} ({bak.name})")
+    return default if data is None else data
 
-def save_json(name: str, data: Any, max_retries: int = 3):
+def save_json(name: str, data: Any, max_retries: int = 3, generation: int | None = None):
     p = _path(name)
     tmp = p.with_suffix(p.suffix + ".tmp")
+    bak = _backup_path(p)
     lock = _get_lock(name)
+    encode = encode_snapshot if STORAGE_FORMAT == "snapshot" else encode_json
     
     for attempt in range(max_retries):
         try:
             with lock:
-                with tmp.open("w", encoding="utf-8") as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
+                # Uma escrita mais nova do mesmo arquivo já foi gravada: esta está obsoleta
+                if generation is not None and generation < _GEN_WRITTEN.get(name, 0):
+                    return
+                # 'data' pode ser uma função que monta os dados: roda aqui, no executor,
+                # e só se esta escrita não estiver obsoleta
+                if callable(data):
+                    data = data()
+                payload = encode(data)
+                with tmp.open("wb") as f:
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                # A versão atual vira .bak só se sabemos que está íntegra
+                # (não queremos trocar um backup bom por um arquivo corrompido)
+                if p.exists() and file_signature(name) == _KNOWN_GOOD.get(name):
+                    p.replace(bak)
                 tmp.replace(p)
+                _KNOWN_GOOD[name] = file_signature(name)
+                if generation is not None:
+                    _GEN_WRITTEN[name] = generation
             return
         except PermissionError:
             if attempt < max_retries - 1:
@@ -74,4 +203,104 @@ def save_json(name: str, data: Any, max_retries: int = 3):
                 raise
         except Exception as e:
             print(f"❌ [STORAGE] Erro ao salvar {name}: {e}")
-            raise
\ No newline at end of file
+            raise
+
+# --- API ASSÍNCRONA ---
+
+async def run_io(fn: Callable, *args, **kwargs):
+    """
+    Executa uma função bloqueante de I/O no executor dedicado.
+    No máximo _IO_QUEUE_MAX chamadas ficam na fila; as demais esperam no event loop
+    (sem ocupar thread nenhuma) e aparecem em io_stats()["waiting"].
+    """
+    loop = asyncio.get_running_loop()
+    # Tempo de espera conta desde aqui: inclui a espera por vaga, não só a fila do executor
+    submitted = time.perf_counter()
+    with _STATS_LOCK:
+        _STATS["waiting"] += 1
+    try:
+        await _IO_SLOTS.acquire()
+    finally:
+        with _STATS_LOCK:
+            _STATS["waiting"] -= 1
+    try:
+        with _STATS_LOCK:
+            _STATS["queued"] += 1
+
+        def job():
+            waited = (time.perf_counter() - submitted) * 1000
+            with _STATS_LOCK:
+                _STATS["queued"] -= 1
+                _STATS["running"] += 1
+                _STATS["maxWaitMs"] = max(_STATS["maxWaitMs"], waited)
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                with _STATS_LOCK:
+                    _STATS["running"] -= 1
+                    _STATS["completed" if ok else "failed"] += 1
+
+        return await loop.run_in_executor(_IO_EXECUTOR, job)
+    finally:
+        _IO_SLOTS.release()
+
+async def load(name: str, default: Any):
+    """Versão assíncrona de load_json, executada no executor de I/O."""
+    return await run_io(load_json, name, default)
+
+async def save(name: str, data: Any):
+    """
+    Versão assíncrona de save_json.
+    'data' pode ser uma função sem argumentos que devolve os dados; ela é chamada no
+    executor, o que tira do event loop a conversão de listas grandes (ex.: modelos -> dicts).
+    A geração é reservada aqui, no event loop, então a ordem das chamadas define
+    qual snapshot prevalece mesmo que o executor as grave fora de ordem.
+    """
+    generation = _GEN_REQUESTED.get(name, 0) + 1
+    _GEN_REQUESTED[name] = generation
+    _IN_FLIGHT[name] = _IN_FLIGHT.get(name, 0) + 1
+    try:
+        await run_io(save_json, name, data, generation=generation)
+    finally:
+        _IN_FLIGHT[name] -= 1
+
+def io_stats() -> dict:
+    """Métricas da fila de I/O (expostas em /api/health)."""
+    with _STATS_LOCK:
+        return {**_STATS, "workers": _IO_WORKERS, "queueMax": _IO_QUEUE_MAX}
+
+def file_signature(name: str):
+    """(mtime, tamanho) do arquivo, ou None se não existir. Usado para invalidar caches."""
+    try:
+        st = _path(name).stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def pending_saves(name: str) -> bool:
+    """True se há escritas assíncronas deste arquivo ainda não gravadas."""
+    return _IN_FLIGHT.get(name, 0) > 0
+
+_ASYNC_LOCKS = {}
+
+def async_lock(name: str) -> asyncio.Lock:
+    """
+    Lock assíncrono por arquivo para ciclos ler-alterar-salvar.
+    Espera no event loop, sem segurar thread do executor.
+    """
+    if name not in _ASYNC_LOCKS:
+        _ASYNC_LOCKS[name] = asyncio.Lock()
+    return _ASYNC_LOCKS[name]
+
+async def save_locked(name: str, data: Any):
+    """
+    save() para arquivos gravados em ciclos ler-alterar-salvar: exige async_lock(name).
+    Um save fora do lock poderia regravar uma lista antiga por cima de uma escrita
+    já confirmada (ex.: desfazer um PUT com If-Match e seu incremento de versão).
+    """
+    if not async_lock(name).locked():
+        raise RuntimeError(f"save of {name} without async_lock({name!r})")
+    await save(name, data)
@@ -4,7 +4,7 @@
 
 from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from app.core.storage import load_json
+from app.core.storage import load, run_io, io_stats
 from app.core.security import create_access_token
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -18,6 +18,8 @@ import uuid
 from app.core.schemas import UserCreate, UserOut
 from app.routes.users import router as users_router
 from app.routes.plants import router as plants_router
+from app.routes.schedules import router as schedules_router
+from app.routes.analytics import router as analytics_router
 
 # Cria o app
 app = FastAPI(title="LoopOS Attachments API", version="1.0.0")
@@ -46,6 +48,8 @@ app.include_router(os_router)
 # Novas rotas
 app.include_router(users_router)
 app.include_router(plants_router)
+app.include_router(schedules_router)
+app.include_router(analytics_router)
 
 # Arquivos estáticos (anexos)
 UPLOAD_ROOT = Path(os.getenv(
@@ -57,9 +61,9 @@ app.mount("/files", StaticFiles(directory=UPLOAD_ROOT), name="files")
 
 
 @app.post("/api/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     # 1. Carrega usuários do JSON (Lado do servidor, seguro)
-    users = load_json("users.json", [])
+    users = await load("users.json", [])
     
     # 2. Procura o usuário
     user = next((u for u in users if u["username"].lower() == form_data.username.lower()), None)
@@ -96,8 +100,9 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
     }
 
 @app.get("/api/health")
-def health():
-    return {"ok": True}
+async def health():
+    # Não toca o disco: continua respondendo mesmo com a fila de I/O cheia
+    return {"ok": True, "io": io_stats()}
 
 
 # Upload de anexos (gravando em /files/{os_id}/<arquivo>)
@@ -117,12 +122,15 @@ async def upload_attachments(
         fname = f"{att_id}{ext}"
         fpath = dest / fname
 
-        with open(fpath, "wb") as out:
+        out = await run_io(open, fpath, "wb")
+        try:
             while True:
                 chunk = await uf.read(1024 * 1024)
                 if not chunk:
                     break
-                out.write(chunk)
+                await run_io(out.write, chunk)
+        finally:
+            await run_io(out.close)
 
         caption = captions[i] if i < len(captions) else ""
         saved.append({
@@ -1,27 +1,30 @@
 # /attachments/app/routes/plants.py
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Header, Query, Response
+from fastapi.responses import JSONResponse
+from typing import List, Optional
 from uuid import uuid4
 import unicodedata
-from app.core.storage import load_json, save_json
+import asyncio
+from app.core.storage import load, save_locked, async_lock
+from app.core.concurrency import check_if_match, etag, bump
+from app.core.listing import parse_fields, filter_ids, paginate, project
 from app.core.schemas import PlantCreate, PlantUpdate, PlantOut, AssignmentsPayload
 
 router = APIRouter(prefix="/api/plants", tags=["plants"])
 _PLANTS_FILE = "plants.json"
 _USERS_FILE  = "users.json"
+_ASSIGNMENT_FIELDS = {"coordinatorId", "supervisorIds", "technicianIds", "assistantIds"}
 
 def normalize_str(s: str) -> str:
     if not s: return ""
     return unicodedata.normalize('NFKD', s).encode('ASCII', 'ignore').decode('ASCII').upper().strip()
 
-def _all_plants() -> List[dict]: return load_json(_PLANTS_FILE, [])
-def _save_plants(plants: List[dict]): save_json(_PLANTS_FILE, plants)
-def _all_users() -> List[dict]: return load_json(_USERS_FILE, [])
-def _save_users(users: List[dict]): save_json(_USERS_FILE, users)
+async def _all_plants() -> List[dict]: return await load(_PLANTS_FILE, [])
+async def _save_plants(plants: List[dict]): await save_locked(_PLANTS_FILE, plants)
+async def _all_users() -> List[dict]: return await load(_USERS_FILE, [])
+async def _save_users(users: List[dict]): await save_locked(_USERS_FILE, users)
 
-def _get_assignments_from_users(plant_id: str) -> dict:
-    users = _all_users()
-    
+def _get_assignments_from_users(plant_id: str, users: List[dict]) -> dict:
     result = {
         "coordinatorId": "",
         "supervisorIds": [],
@@ -51,8 +54,12 @@ def _get_assignments_from_users(plant_id: str) -> dict:
     
     return result
 
-def _update_users_from_assignments_payload(plant_id: str, ap: AssignmentsPayload):
-    users = _all_users()
+async def _update_users_from_assignments_payload(plant_id: str, ap: AssignmentsPayload):
+    async with async_lock(_USERS_FILE):
+        await _apply_assignments_to_users(plant_id, ap)
+
+async def _apply_assignments_to_users(plant_id: str, ap: AssignmentsPayload):
+    users = await _all_users()
     changed = False
 
     # Coleta todos os IDs que DEVEM estar nesta planta
@@ -92,7 +99,7 @@ def _update_users_from_assignments_payload(plant_id: str, ap: AssignmentsPayload
             print(f"   🔄 Alterado user {u['name']}: {original_plants} -> {user_plants}")
 
     if changed:
-        _save_users(users)
+        await _save_users(users)
         print("   💾 users.json salvo com sucesso.")
     else:
         print("   ℹ️ Nenhuma alteração necessária no users.json.")
@@ -100,19 +107,39 @@ def _update_users_from_assignments_payload(plant_id: str, ap: AssignmentsPayload
 # --- ROTAS ---
 
 @router.get("", response_model=List[PlantOut])
-def list_plants():
-    plants = _all_plants()
-    for plant in plants:
-        plant.update(_get_assignments_from_users(plant["id"]))
+async def list_plants(
+    response: Response,
+    fields: Optional[str] = None,
+    ids: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+):
+    # fields=id,name  ids=a,b  limit=50&cursor=<X-Next-Cursor da página anterior>
+    wanted = parse_fields(fields, PlantOut.model_fields)
+    plants = filter_ids(await _all_plants(), ids)
+    plants, next_cursor = paginate(plants, limit, cursor)
+
+    # O join com users.json só acontece se algum campo de assignment foi pedido
+    if wanted is None or _ASSIGNMENT_FIELDS.intersection(wanted):
+        users = await _all_users()
+        for plant in plants:
+            plant.update(_get_assignments_from_users(plant["id"], users))
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if wanted is not None:
+        # Resposta parcial: não passa pelo response_model (que exigiria todos os campos)
+        return JSONResponse(project(plants, wanted, PlantOut), headers=headers)
+    response.headers.update(headers)
     return plants
 
 @router.post("", response_model=PlantOut, status_code=201)
-def create_plant(payload: PlantCreate):
-    plants = _all_plants()
-    plant = payload.dict(exclude={'coordinatorId', 'supervisorIds', 'technicianIds', 'assistantIds'})
-    plant["id"] = str(uuid4())
-    plants.append(plant)
-    _save_plants(plants)
+async def create_plant(payload: PlantCreate):
+    async with async_lock(_PLANTS_FILE):
+        plants = await _all_plants()
+        plant = payload.dict(exclude={'coordinatorId', 'supervisorIds', 'technicianIds', 'assistantIds'})
+        plant["id"] = str(uuid4())
+        plants.append(plant)
+        await _save_plants(plants)
     
     ap = AssignmentsPayload(
         coordinatorId=getattr(payload, 'coordinatorId', "") or "",
@@ -120,30 +147,39 @@ def create_plant(payload: PlantCreate):
         technicianIds=getattr(payload, 'technicianIds', []) or [],
         assistantIds=getattr(payload, 'assistantIds', []) or [],
     )
-    _update_users_from_assignments_payload(plant["id"], ap)
+    await _update_users_from_assignments_payload(plant["id"], ap)
     return {**plant, **ap.dict()}
 
 @router.get("/{plant_id}", response_model=PlantOut)
-def get_plant(plant_id: str):
-    plants = _all_plants()
+async def get_plant(plant_id: str, response: Response):
+    plants, users = await asyncio.gather(_all_plants(), _all_users())
     plant = next((p for p in plants if p["id"] == plant_id), None)
     if not plant: raise HTTPException(404, "Plant not found")
-    return {**plant, **_get_assignments_from_users(plant_id)}
+    response.headers["ETag"] = etag(plant)
+    return {**plant, **_get_assignments_from_users(plant_id, users)}
 
 @router.put("/{plant_id}", response_model=PlantOut)
-def update_plant(plant_id: str, payload: PlantUpdate):
+async def update_plant(
+    plant_id: str,
+    payload: PlantUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+):
     print(f"📥 PUT RECEBIDO para planta {plant_id}")
     
-    plants = _all_plants()
-    updated_plant = None
-    for i, p in enumerate(plants):
-        if p["id"] == plant_id:
-            data = payload.dict(exclude={'coordinatorId', 'supervisorIds', 'technicianIds', 'assistantIds'})
-            plants[i] = {**p, **data}
-            updated_plant = plants[i]
-            break
-    if not updated_plant: raise HTTPException(404, "Plant not found")
-    _save_plants(plants)
+    # O lock cobre só o ciclo ler-verificar-salvar de plants.json
+    async with async_lock(_PLANTS_FILE):
+        plants = await _all_plants()
+        updated_plant = None
+        for i, p in enumerate(plants):
+            if p["id"] == plant_id:
+                check_if_match(if_match, p)
+                data = payload.dict(exclude={'coordinatorId', 'supervisorIds', 'technicianIds', 'assistantIds'})
+                plants[i] = bump({**p, **data}, p)
+                updated_plant = plants[i]
+                break
+        if not updated_plant: raise HTTPException(404, "Plant not found")
+        await _save_plants(plants)
     
     # Extrai assignments do payload
     ap = AssignmentsPayload(
@@ -154,33 +190,38 @@ def update_plant(plant_id: str, payload: PlantUpdate):
     )
     
     # Atualiza usuários
-    _update_users_from_assignments_payload(plant_id, ap)
+    await _update_users_from_assignments_payload(plant_id, ap)
     
     # Retorna estado atualizado lendo do disco recém salvo
-    final_state = _get_assignments_from_users(plant_id)
+    final_state = _get_assignments_from_users(plant_id, await _all_users())
     print(f"📤 PUT RETORNANDO: {final_state}")
     
+    response.headers["ETag"] = etag(updated_plant)
     return {**updated_plant, **final_state}
 
 @router.delete("/{plant_id}")
-def delete_plant(plant_id: str):
-    plants = _all_plants()
-    new_plants = [p for p in plants if p["id"] != plant_id]
-    if len(new_plants) == len(plants): raise HTTPException(404, "Plant not found")
-    _save_plants(new_plants)
+async def delete_plant(plant_id: str):
+    async with async_lock(_PLANTS_FILE):
+        plants = await _all_plants()
+        new_plants = [p for p in plants if p["id"] != plant_id]
+        if len(new_plants) == len(plants): raise HTTPException(404, "Plant not found")
+        await _save_plants(new_plants)
     
     # Limpa users
-    _update_users_from_assignments_payload(plant_id, AssignmentsPayload())
+    await _update_users_from_assignments_payload(plant_id, AssignmentsPayload())
     
     return {"detail": "deleted"}
 
 @router.get("/{plant_id}/assignments", response_model=AssignmentsPayload)
-def get_assignments(plant_id: str):
-    if not any(p["id"] == plant_id for p in _all_plants()): raise HTTPException(404, "Plant not found")
-    return _get_assignments_from_users(plant_id)
+async def get_assignments(plant_id: str):
+    plants, users = await asyncio.gather(_all_plants(), _all_users())
+    if not any(p["id"] == plant_id for p in plants): raise HTTPException(404, "Plant not found")
+    return _get_assignments_from_users(plant_id, users)
 
 @router.put("/{plant_id}/assignments", response_model=AssignmentsPayload)
-def put_assignments(plant_id: str, payload: AssignmentsPayload):
-    if not any(p["id"] == plant_id for p in _all_plants()): raise HTTPException(404, "Plant not found")
-    _update_users_from_assignments_payload(plant_id, payload)
+async def put_assignments(plant_id: str, payload: AssignmentsPayload):
+    # Ordem dos locks: plants.json antes de users.json (nunca o contrário)
+    async with async_lock(_PLANTS_FILE), async_lock(_USERS_FILE):
+        if not any(p["id"] == plant_id for p in await _all_plants()): raise HTTPException(404, "Plant not found")
+        await _apply_assignments_to_users(plant_id, payload)
     return payload
\ No newline at end of file
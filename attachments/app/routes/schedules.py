@@ -0,0 +1,92 @@
+# /attachments/app/routes/schedules.py
+# Agendamentos de manutenção preventiva e geração das OS recorrentes.
+from fastapi import APIRouter, HTTPException
+from typing import List, Optional
+from uuid import uuid4
+from datetime import date, datetime
+import asyncio
+from app.core.storage import load, save_locked, async_lock, run_io
+from app.core.schemas import ScheduleCreate, ScheduleUpdate, ScheduleOut
+from app.core import scheduler
+from app.routes.plants import _all_plants, _all_users, _get_assignments_from_users
+from os_api import OSCreate, _insert_many, _load as _load_os
+
+router = APIRouter(prefix="/api/schedules", tags=["schedules"])
+_SCHEDULES_FILE = "schedules.json"
+
+async def _all_schedules() -> List[dict]: return await load(_SCHEDULES_FILE, [])
+async def _save_schedules(schedules: List[dict]): await save_locked(_SCHEDULES_FILE, schedules)
+
+@router.get("", response_model=List[ScheduleOut])
+async def list_schedules():
+    return await _all_schedules()
+
+@router.post("", response_model=ScheduleOut, status_code=201)
+async def create_schedule(payload: ScheduleCreate):
+    async with async_lock(_SCHEDULES_FILE):
+        schedules = await _all_schedules()
+        schedule = {**payload.dict(), "id": str(uuid4()), "generatedThrough": None}
+        schedules.append(schedule)
+        await _save_schedules(schedules)
+    return schedule
+
+@router.put("/{schedule_id}", response_model=ScheduleOut)
+async def update_schedule(schedule_id: str, payload: ScheduleUpdate):
+    async with async_lock(_SCHEDULES_FILE):
+        schedules = await _all_schedules()
+        for i, s in enumerate(schedules):
+            if s["id"] == schedule_id:
+                # generatedThrough é mantido: ocorrências já geradas não voltam
+                schedules[i] = {**s, **payload.dict()}
+                await _save_schedules(schedules)
+                return schedules[i]
+    raise HTTPException(404, "Schedule not found")
+
+@router.delete("/{schedule_id}")
+async def delete_schedule(schedule_id: str):
+    async with async_lock(_SCHEDULES_FILE):
+        schedules = await _all_schedules()
+        new_schedules = [s for s in schedules if s["id"] != schedule_id]
+        if len(new_schedules) == len(schedules): raise HTTPException(404, "Schedule not found")
+        await _save_schedules(new_schedules)
+    return {"detail": "deleted"}
+
+@router.post("/run")
+async def run_schedules(until: Optional[str] = None):
+    """
+    Gera as OS de todas as ocorrências vencidas até 'until' (padrão: hoje).
+    Todas as OS novas vão para o disco numa única escrita; rodar de novo não duplica,
+    pois cada OS carrega um scheduleKey e cada agendamento guarda até onde já gerou.
+    """
+    try:
+        limit = date.fromisoformat(until) if until else datetime.utcnow().date()
+    except ValueError:
+        raise HTTPException(422, "until must be YYYY-MM-DD")
+
+    async with async_lock(_SCHEDULES_FILE):
+        schedules, plants, users, os_list = await asyncio.gather(
+            _all_schedules(), _all_plants(), _all_users(), _load_os()
+        )
+        existing_keys = await run_io(lambda: {o.scheduleKey for o in os_list if o.scheduleKey})
+        result = scheduler.generate(
+            schedules,
+            plants,
+            lambda pid: _get_assignments_from_users(pid, users),
+            existing_keys,
+            limit,
+        )
+        created = []
+        if result["items"]:
+            items = result["items"]
+            created = await _insert_many(
+                [OSCreate(**item) for item in items],
+                schedule_keys=[item["scheduleKey"] for item in items],
+            )
+
+        # Marca o progresso só depois que as OS estão em disco
+        for s in schedules:
+            if s["id"] in result["generatedThrough"]:
+                s["generatedThrough"] = result["generatedThrough"][s["id"]]
+        await _save_schedules(schedules)
+
+    return {"created": len(created), "ids": [o.id for o in created], "until": limit.isoformat()}
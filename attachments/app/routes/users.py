@@ -1,20 +1,23 @@
 # /attachments/app/routes/users.py
-from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi import APIRouter, HTTPException, Query, Request, Header, Response
+from fastapi.responses import JSONResponse
 from typing import List, Optional
 from uuid import uuid4
-from app.core.storage import load_json, save_json
+from app.core.storage import load, save_locked, async_lock
 from app.core.schemas import UserCreate, UserUpdate, UserOut
 from app.core.rbac import can_view_user, can_edit_user
 from app.core.sync import sync_assignments_from_users
+from app.core.concurrency import check_if_match, etag, bump
+from app.core.listing import parse_fields, filter_ids, paginate, project
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 _USERS_FILE = "users.json"
 
-def _all_users() -> list[dict]:
-    return load_json(_USERS_FILE, [])
+async def _all_users() -> list[dict]:
+    return await load(_USERS_FILE, [])
 
-def _save_users(users: list[dict]):
-    save_json(_USERS_FILE, users)
+async def _save_users(users: list[dict]):
+    await save_locked(_USERS_FILE, users)
 
 def _exists_username(users: List[dict], username: str, *, skip_id: str | None = None) -> bool:
     u_lower = username.lower()
@@ -35,52 +38,79 @@ def _actor_from_headers(req: Request, users: list[dict]) -> dict:
     return {"id":"anon","role": (rrole or "Auxiliar"), "plantIds": []}
 
 @router.get("", response_model=List[UserOut])
-def list_users(request: Request):
-    users = _all_users()
+async def list_users(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = None,
+    ids: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+):
+    # fields=id,name  ids=a,b  limit=50&cursor=<X-Next-Cursor da página anterior>
+    wanted = parse_fields(fields, UserOut.model_fields)
+    users = await _all_users()
     # --- CORREÇÃO: Retorna todos os usuários para permitir o Login ---
     # Antes: return [u for u in users if can_view_user(actor, u)]
+    users, next_cursor = paginate(filter_ids(users, ids), limit, cursor)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if wanted is not None:
+        # Resposta parcial: não passa pelo response_model; parse_fields já barrou a senha
+        return JSONResponse(project(users, wanted, UserOut), headers=headers)
+    response.headers.update(headers)
     return users
     # ---------------------------------------------------------------
     
 @router.post("", response_model=UserOut, status_code=201)
-def create_user(request: Request, payload: UserCreate):
-    users = _all_users()
-    actor = _actor_from_headers(request, users)
+async def create_user(request: Request, payload: UserCreate):
+    # Ler-alterar-salvar de users.json sempre sob o lock do arquivo
+    async with async_lock(_USERS_FILE):
+        users = await _all_users()
+        actor = _actor_from_headers(request, users)
     
-    dummy = {**payload.dict(), "id":"new", "plantIds": payload.dict().get("plantIds", [])}
+        dummy = {**payload.dict(), "id":"new", "plantIds": payload.dict().get("plantIds", [])}
     
-    # Mantém a segurança na criação/edição
-    if not can_edit_user(actor, dummy):
-        raise HTTPException(403, "forbidden")
+        # Mantém a segurança na criação/edição
+        if not can_edit_user(actor, dummy):
+            raise HTTPException(403, "forbidden")
     
-    if _exists_username(users, payload.username):
-        raise HTTPException(status_code=409, detail="username already exists")
+        if _exists_username(users, payload.username):
+            raise HTTPException(status_code=409, detail="username already exists")
     
-    supervisor_id = payload.dict().get("supervisorId", None)
-    if not supervisor_id or str(supervisor_id).strip() == "":
-        supervisor_id = None
+        supervisor_id = payload.dict().get("supervisorId", None)
+        if not supervisor_id or str(supervisor_id).strip() == "":
+            supervisor_id = None
     
-    new_user = {
-        "id": str(uuid4()),
-        "name": payload.name,
-        "username": payload.username,
-        "email": payload.email,
-        "password": payload.password,
-        "phone": payload.phone,
-        "role": payload.role,
-        "can_login": True,
-        "plantIds": payload.dict().get("plantIds", []),
-        "supervisorId": supervisor_id,
-    }
+        new_user = {
+            "id": str(uuid4()),
+            "name": payload.name,
+            "username": payload.username,
+            "email": payload.email,
+            "password": payload.password,
+            "phone": payload.phone,
+            "role": payload.role,
+            "can_login": True,
+            "plantIds": payload.dict().get("plantIds", []),
+            "supervisorId": supervisor_id,
+        }
     
-    users.append(new_user)
-    _save_users(users)
-    sync_assignments_from_users()
-    return new_user
+        users.append(new_user)
+        await _save_users(users)
+        sync_assignments_from_users()
+        return new_user
 
 @router.put("/{user_id}", response_model=UserOut)
-def update_user(user_id: str, payload: UserUpdate, request: Request):
-    users = _all_users()
+async def update_user(
+    user_id: str,
+    payload: UserUpdate,
+    request: Request,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+):
+    async with async_lock(_USERS_FILE):
+        return await _update_user(user_id, payload, request, response, if_match)
+
+async def _update_user(user_id, payload, request, response, if_match):
+    users = await _all_users()
     actor = _actor_from_headers(request, users)
     
     current_user = next((u for u in users if u["id"] == user_id), None)
@@ -94,6 +124,9 @@ def update_user(user_id: str, payload: UserUpdate, request: Request):
     elif not can_edit_user(actor, current_user):
         raise HTTPException(status_code=403, detail="forbidden")
     
+    # 412 devolve o registro atual, mas nunca a senha
+    check_if_match(if_match, {k: v for k, v in current_user.items() if k != "password"})
+    
     update_data = payload.dict(exclude_unset=True)
     
     if "supervisorId" in update_data:
@@ -107,19 +140,21 @@ def update_user(user_id: str, payload: UserUpdate, request: Request):
     
     for i, u in enumerate(users):
         if u["id"] == user_id:
-            updated = {**u, **update_data}
+            updated = bump({**u, **update_data}, u)
             users[i] = updated
-            _save_users(users)
+            await _save_users(users)
             sync_assignments_from_users()
+            response.headers["ETag"] = etag(updated)
             return updated
     
     raise HTTPException(status_code=404, detail="User not found")
 
 @router.delete("/{user_id}")
-def delete_user(user_id: str):
-    users = _all_users()
-    new_users = [u for u in users if u["id"] != user_id]
-    if len(new_users) == len(users):
-        raise HTTPException(status_code=404, detail="User not found")
-    _save_users(new_users)
+async def delete_user(user_id: str):
+    async with async_lock(_USERS_FILE):
+        users = await _all_users()
+        new_users = [u for u in users if u["id"] != user_id]
+        if len(new_users) == len(users):
+            raise HTTPException(status_code=404, detail="User not found")
+        await _save_users(new_users)
     return {"detail": "deleted"}
\ No newline at end of file
@@ -0,0 +1,71 @@
+# /attachments/benchmarks/bench_analytics.py
+# Benchmark do snapshot colunar de KPIs com N OS sintéticas.
+# Uso (a partir de /attachments):  python -m benchmarks.bench_analytics [N]
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from app.core import analytics
+
+STATUSES = ["Pendente", "Em Progresso", "Em Revisão", "Concluído"]
+PRIORITIES = ["Baixa", "Média", "Alta", "Urgente"]
+
+def _iso(d: datetime) -> str:
+    return d.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+def synthetic(n: int, plants: int = 2000, technicians: int = 800):
+    rnd = random.Random(42)
+    base = datetime(2019, 1, 1)
+    for i in range(n):
+        created = base + timedelta(minutes=rnd.randrange(0, 6 * 365 * 24 * 60))
+        status = rnd.choice(STATUSES)
+        done = created + timedelta(hours=rnd.randrange(1, 24 * 30))
+        yield {
+            "id": f"OS{i:07d}",
+            "status": status,
+            "priority": rnd.choice(PRIORITIES),
+            "plantId": f"plant-{rnd.randrange(plants)}",
+            "technicianId": f"user-{rnd.randrange(technicians)}",
+            "createdAt": _iso(created),
+            "startDate": _iso(created + timedelta(days=rnd.randrange(0, 10))),
+            "updatedAt": _iso(done if status == "Concluído" else created),
+            "logs": [],
+        }
+
+def _time(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000, result
+
+def main(n: int):
+    records = list(synthetic(n))
+    plant_clients = {f"plant-{i}": f"CLIENTE {i % 40}" for i in range(2000)}
+    now = int(datetime.now(timezone.utc).timestamp())
+
+    t = time.perf_counter()
+    analytics.reset(records)
+    print(f"snapshot build ({n:,} OS): {(time.perf_counter() - t) * 1000:.0f} ms")
+    cols = analytics.snapshot()
+
+    t = time.perf_counter()
+    analytics.upsert(records[:1000])
+    print(f"incremental upsert (1,000 OS): {(time.perf_counter() - t) * 1000:.1f} ms")
+
+    cases = [
+        ("plant", dict(group_by=["plant"])),
+        ("client,month", dict(group_by=["client", "month"])),
+        ("plant,month", dict(group_by=["plant", "month"])),
+        ("technician,month", dict(group_by=["technician", "month"])),
+        ("month, 1 client", dict(group_by=["month"], clients=["CLIENTE 7"])),
+    ]
+    for label, kwargs in cases:
+        ms_cols, columns = _time(lambda: analytics.query_columns(cols, plant_clients=plant_clients, now=now, **kwargs))
+        ms_rows, rows = _time(lambda: analytics.query(cols, plant_clients=plant_clients, now=now, **kwargs))
+        print(f"query groupBy={label:<18} colunas {ms_cols:7.1f} ms | linhas {ms_rows:7.1f} ms  ({len(rows):,} grupos)")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
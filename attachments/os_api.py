@@ -1,9 +1,12 @@
 # File: attachments/os_api.py
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional
-from pathlib import Path
-import json, threading
+from fastapi import APIRouter, HTTPException, Header, Response
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from datetime import datetime
+import asyncio, json, os, re
+from app.core.storage import load, save, run_io, file_signature, pending_saves
+from app.core import sequence, analytics
+from app.core.concurrency import check_if_match, etag, bump
 
 class OSModel(BaseModel):
     id: str
@@ -22,47 +25,203 @@ class OSModel(BaseModel):
     updatedAt: str
     logs: List[dict] = []
     imageAttachments: List[dict] = []
+    version: int = 0
+    # Preenchido em OS geradas por agendamento preventivo: "<scheduleId>:<plantId>:<ativo>:<data>"
+    scheduleKey: Optional[str] = None
+
+class OSCreate(OSModel):
+    # O id é sempre atribuído pelo servidor; o que vier do cliente é ignorado.
+    id: Optional[str] = None
+    title: Optional[str] = None
+    createdAt: Optional[str] = None
+    updatedAt: Optional[str] = None
+    # Só o gerador de agendamentos define a chave (ver _insert_many); vinda do cliente, é descartada
+    scheduleKey: Optional[str] = Field(None, exclude=True)
 
 router = APIRouter(prefix="/api/os", tags=["os"])
 
-BASE = Path(__file__).parent
-DATA_FILE = BASE / "data" / "os.json"
-DATA_FILE.parent.mkdir(parents=True, exist_ok=True)
+_OS_FILE = "os.json"
+
+# Escopo da numeração: "global" (OS0001), "year" (OS2025-0001) ou "plant" (OS-<plantId>-0001)
+OS_ID_SCOPE = os.getenv("LOOPOS_OS_ID_SCOPE", "global")
+
+_load_lock = asyncio.Lock()
+
+# Cache em memória: id -> OSModel, em ordem de criação (mais antiga primeiro).
+# O arquivo guarda a ordem inversa (mais nova primeiro), como antes.
+_index: Dict[str, OSModel] = {}
+_loaded_sig = None
+_loaded = False
+_seeded_seqs = set()
+# Incrementado a cada alteração do índice em memória (ver _ensure_loaded)
+_mutations = 0
+
+def _build(raw: List[dict]):
+    # Roda no pool de I/O: com 1M de OS leva segundos e travaria o event loop
+    index = {o["id"]: OSModel(**o) for o in reversed(raw)}
+    return index, analytics.build(raw)
+
+async def _ensure_loaded():
+    """Carrega os.json no índice, recarregando se o arquivo mudou por fora (ex.: sync do Nextcloud)."""
+    global _index, _loaded_sig, _loaded
+    async with _load_lock:
+        if _loaded and pending_saves(_OS_FILE):
+            return
+        sig = await run_io(file_signature, _OS_FILE)
+        if _loaded and sig == _loaded_sig:
+            return
+        seen = _mutations
+        raw = await load(_OS_FILE, [])
+        index, cols = await run_io(_build, raw)
+        # Uma escrita nossa pode ter acontecido durante a leitura/montagem: o índice em memória é mais novo
+        if _loaded and (_mutations != seen or pending_saves(_OS_FILE)):
+            return
+        _index = index
+        analytics.install(cols)
+        _loaded_sig = sig
+        _loaded = True
+
+async def _load() -> List[OSModel]:
+    await _ensure_loaded()
+    return list(reversed(_index.values()))
 
-_lock = threading.Lock()
+def _dump(items: List[OSModel]) -> List[dict]:
+    # Ordem do arquivo: mais nova primeiro
+    return [o.dict() for o in reversed(items)]
 
-def _load() -> List[OSModel]:
-    if DATA_FILE.exists():
-        with DATA_FILE.open("r", encoding="utf-8") as f:
-            raw = json.load(f)
-        return [OSModel(**o) for o in raw]
-    return []
+async def _save():
+    global _loaded_sig
+    # Só a cópia da lista acontece no event loop; a conversão para dict roda no executor.
+    # Os modelos do índice nunca são alterados no lugar (update troca o objeto), então a cópia basta.
+    items = list(_index.values())
+    await save(_OS_FILE, lambda: _dump(items))
+    if not pending_saves(_OS_FILE):
+        _loaded_sig = await run_io(file_signature, _OS_FILE)
 
-def _save(items: List[OSModel]):
-    with DATA_FILE.open("w", encoding="utf-8") as f:
-        json.dump([o.dict() for o in items], f, ensure_ascii=False, indent=2)
+def _seq_name_and_format(plant_id: str):
+    if OS_ID_SCOPE == "year":
+        year = datetime.utcnow().year
+        return f"os:{year}", lambda n: f"OS{year}-{n:04d}"
+    if OS_ID_SCOPE == "plant":
+        return f"os:{plant_id}", lambda n: f"OS-{plant_id}-{n:04d}"
+    return "os", lambda n: f"OS{n:04d}"
+
+def _seed_floor(fmt, ids: List[str]) -> int:
+    # Maior número já usado com este formato; só é calculado na primeira reserva do processo
+    pattern = re.compile("^" + re.escape(fmt(0)[:-4]) + r"(\d+)$")
+    nums = [int(m.group(1)) for m in map(pattern.match, ids) if m]
+    return max(nums, default=0)
+
+async def _allocate_ids(plant_ids: List[str]) -> List[str]:
+    """
+    Aloca um id novo para cada plantId da lista (na mesma ordem),
+    reservando um intervalo por sequência em vez de um número por vez.
+    """
+    groups: Dict[str, list] = {}
+    for i, pid in enumerate(plant_ids):
+        name, fmt = _seq_name_and_format(pid)
+        groups.setdefault(name, [fmt, []])[1].append(i)
+
+    out: List[Optional[str]] = [None] * len(plant_ids)
+    for name, (fmt, positions) in groups.items():
+        pending = list(positions)
+        while pending:
+            floor = 0
+            if name not in _seeded_seqs:
+                # Varre todos os ids: fora do event loop, sobre uma cópia da lista de chaves.
+                # Duas reservas concorrentes podem calcular o piso ao mesmo tempo; é inofensivo.
+                floor = await run_io(_seed_floor, fmt, list(_index))
+                _seeded_seqs.add(name)
+            rng = await sequence.reserve(name, len(pending), floor=floor)
+            # Ids criados manualmente no arquivo podem colidir: pula e reserva mais
+            free = [fmt(n) for n in rng if fmt(n) not in _index]
+            for pos, new_id in zip(pending, free):
+                out[pos] = new_id
+            pending = pending[len(free):]
+    return out
+
+def _now() -> str:
+    return datetime.utcnow().isoformat(timespec="milliseconds") + "Z"
+
+async def _insert_many(payloads: List[OSCreate], schedule_keys: Optional[List[str]] = None) -> List[OSModel]:
+    """
+    Cria várias OS numa única escrita em disco.
+    'schedule_keys' (um por payload) só é passado pelo gerador de agendamentos.
+    """
+    global _mutations
+    await _ensure_loaded()
+    ids = await _allocate_ids([p.plantId for p in payloads])
+    keys = schedule_keys or [None] * len(payloads)
+    now = _now()
+    created = []
+    for new_id, key, p in zip(ids, keys, payloads):
+        data = p.dict()
+        data["id"] = new_id
+        data["scheduleKey"] = key
+        data["title"] = f"{new_id} - {p.activity}"
+        data["createdAt"] = p.createdAt or now
+        data["updatedAt"] = p.updatedAt or now
+        data["version"] = 1
+        created.append(OSModel(**data))
+    _mutations += 1
+    for o in created:
+        _index[o.id] = o
+    analytics.upsert([o.dict() for o in created])
+    await _save()
+    return created
 
 @router.get("", response_model=List[OSModel])
-def list_os():
-    return _load()
+async def list_os():
+    await _ensure_loaded()
+    items = list(_index.values())
+    # Com dezenas de milhares de OS, validar/serializar a resposta travaria o event loop:
+    # o JSON é montado no executor e devolvido pronto (o índice já contém OSModel válidos)
+    body = await run_io(lambda: json.dumps(_dump(items), ensure_ascii=False).encode("utf-8"))
+    return Response(content=body, media_type="application/json")
 
 @router.post("", response_model=OSModel)
-def create_os(payload: OSModel):
-    with _lock:
-        data = _load()
-        if any(o.id == payload.id for o in data):
-            raise HTTPException(400, "OS id already exists")
-        data.insert(0, payload)
-        _save(data)
-        return payload
+async def create_os(payload: OSCreate):
+    return (await _insert_many([payload]))[0]
+
+@router.post("/batch", response_model=List[OSModel])
+async def create_os_batch(payload: List[OSCreate]):
+    if not payload:
+        return []
+    return await _insert_many(payload)
+
+@router.get("/{os_id}", response_model=OSModel)
+async def get_os(os_id: str, response: Response):
+    await _ensure_loaded()
+    current = _index.get(os_id)
+    if current is None:
+        raise HTTPException(404, "OS not found")
+    response.headers["ETag"] = etag(current.dict())
+    return current
 
 @router.put("/{os_id}", response_model=OSModel)
-def update_os(os_id: str, payload: OSModel):
-    with _lock:
-        data = _load()
-        for i, o in enumerate(data):
-            if o.id == os_id:
-                data[i] = payload
-                _save(data)
-                return payload
-    raise HTTPException(404, "OS not found")
\ No newline at end of file
+async def update_os(
+    os_id: str,
+    payload: OSModel,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+):
+    global _mutations
+    await _ensure_loaded()
+    current = _index.get(os_id)
+    if current is None:
+        raise HTTPException(404, "OS not found")
+    # Verificar e substituir acontece sem await no meio: é atômico no event loop,
+    # então não há lock global; escritas em OS diferentes não competem entre si.
+    check_if_match(if_match, current.dict())
+    # O id da rota prevalece: o índice é chaveado por ele
+    # scheduleKey não é editável pelo cliente: mantém o valor atual
+    updated = OSModel(**bump(
+        {**payload.dict(), "id": os_id, "scheduleKey": current.scheduleKey},
+        current.dict(),
+    ))
+    _mutations += 1
+    _index[os_id] = updated
+    analytics.upsert([updated.dict()])
+    await _save()
+    response.headers["ETag"] = etag(updated.dict())
+    return updated
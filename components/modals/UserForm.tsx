@@ -152,7 +152,7 @@ const UserForm: React.FC<UserFormProps> = ({ isOpen, onClose, initialData, role
       }
       
       console.log('Enviando para backend:', dataToUpdate);
-      updateUser(dataToUpdate as User);
+      updateUser(dataToUpdate as User).catch(err => alert(err.message));
     } else {
       addUser(formData);
     }
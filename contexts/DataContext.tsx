@@ -168,6 +168,10 @@ export const DataProvider: React.FC<{ children: ReactNode }> = ({ children }) =>
     return fetch(url, { ...init, headers });
   }, []);
 
+  // Controle de concorrência: PUT só é aceito se o registro ainda estiver na versão editada
+  const ifMatch = (version?: number): Record<string, string> =>
+    version === undefined ? {} : { 'If-Match': `"${version}"` };
+
   const waitHealth = React.useCallback(async () => {
     try { const r = await api('/api/health'); return r.ok; } catch { return false; }
   }, [api]);
@@ -289,7 +293,13 @@ export const DataProvider: React.FC<{ children: ReactNode }> = ({ children }) =>
 
 
   const updateUser = async (u: User) => {
-    const res = await api(`/api/users/${u.id}`, { method: 'PUT', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(u) });
+    const res = await api(`/api/users/${u.id}`, { method: 'PUT', headers: { 'Content-Type': 'application/json', ...ifMatch(u.version) }, body: JSON.stringify(u) });
+    if (res.status === 412) {
+      // Outra pessoa salvou antes: fica a versão do servidor e a edição é recusada
+      const { detail } = await res.json();
+      setUsers(prev => prev.map(x => (x.id === detail.id ? detail : x)));
+      throw new Error('Usuário alterado por outra pessoa; recarregado com a versão atual');
+    }
     if (!res.ok) throw new Error('Falha ao atualizar usuário');
     const saved: User = await res.json();
     setUsers(prev => prev.map(x => (x.id === saved.id ? saved : x)));
@@ -358,10 +368,16 @@ export const DataProvider: React.FC<{ children: ReactNode }> = ({ children }) =>
       // 2. Envia para o Backend
       const res = await api(`/api/plants/${plant.id}`, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...ifMatch(plant.version) },
         body: JSON.stringify(payload),
       });
-      
+
+      if (res.status === 412) {
+        // Outra pessoa salvou antes: recarrega em vez de sobrescrever com a cópia local
+        console.warn(`⚠️ Usina ${plant.id} alterada por outra pessoa; recarregada com a versão atual.`);
+        await reloadFromAPI();
+        return;
+      }
       if (!res.ok) throw new Error();
       
       // 3. Atualiza a lista de Plantas localmente
@@ -379,9 +395,10 @@ export const DataProvider: React.FC<{ children: ReactNode }> = ({ children }) =>
 
   const addOS = async (osData: Omit<OS, 'id'|'title'|'createdAt'|'updatedAt'|'logs'|'imageAttachments'>) => {
     const now = new Date().toISOString();
+    // Id provisório (modo offline); o servidor atribui o definitivo na criação
     const nextIdNumber = (osList.length > 0 ? Math.max(...osList.map(os => parseInt(os.id.replace(/\D/g, ''), 10))) : 0) + 1;
     const newId = `OS${String(nextIdNumber).padStart(4, '0')}`;
-    const newTitle = `${newId} - ${osData.activity}`;
+    let newTitle = `${newId} - ${osData.activity}`;
     const payload: OS = {
       ...osData,
       id: newId,
@@ -396,6 +413,7 @@ export const DataProvider: React.FC<{ children: ReactNode }> = ({ children }) =>
       const res = await api('/api/os', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(payload) });
       if (!res.ok) throw new Error();
       const saved: OS = await res.json();
+      newTitle = saved.title;
       setOsList(prev => [saved, ...prev]);
     } catch {
       setOsList(prev => [payload, ...prev]);
@@ -406,14 +424,28 @@ export const DataProvider: React.FC<{ children: ReactNode }> = ({ children }) =>
 
   const updateOS = async (updatedOS: OS) => {
     const finalOS = { ...updatedOS, title: `${updatedOS.id} - ${updatedOS.activity}`, updatedAt: new Date().toISOString() };
+    let res: Response;
     try {
-      const res = await api(`/api/os/${finalOS.id}`, { method: 'PUT', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(finalOS) });
-      if (!res.ok) throw new Error();
-      const saved: OS = await res.json();
-      setOsList(prev => prev.map(os => (os.id === saved.id ? saved : os)));
+      res = await api(`/api/os/${finalOS.id}`, { method: 'PUT', headers: { 'Content-Type': 'application/json', ...ifMatch(updatedOS.version) }, body: JSON.stringify(finalOS) });
     } catch {
+      // Sem conexão com a API: mantém a alteração local
       setOsList(prev => prev.map(os => (os.id === finalOS.id ? finalOS : os)));
+      return;
+    }
+    if (res.status === 412) {
+      // Outra pessoa salvou antes (ex.: um comentário novo): fica a versão do servidor,
+      // em vez de sobrescrever a OS inteira com a cópia local desatualizada
+      const { detail } = await res.json();
+      console.warn(`⚠️ OS ${finalOS.id} alterada por outra pessoa; recarregada com a versão atual.`);
+      setOsList(prev => prev.map(os => (os.id === detail.id ? detail : os)));
+      return;
+    }
+    if (!res.ok) {
+      console.error(`❌ Erro ao atualizar OS ${finalOS.id}: HTTP ${res.status}`);
+      return;
     }
+    const saved: OS = await res.json();
+    setOsList(prev => prev.map(os => (os.id === saved.id ? saved : os)));
   };
 
   const addOSLog = (osId: string, log: Omit<OSLog, 'id'|'timestamp'>) => {
@@ -23,6 +23,7 @@ export interface User {
     supervisorId?: string; // ID do supervisor responsável (apenas para técnicos).
     password?: string; // Senha (opcional para não ser exposta no frontend).
     plantIds?: string[]; // IDs das usinas às quais o usuário está associado.
+    version?: number; // Versão do registro (enviada no If-Match ao salvar).
 }
 
 
@@ -61,6 +62,7 @@ export interface Plant {
     supervisorIds?: string[];
     technicianIds?: string[];
     assistantIds?: string[];
+    version?: number; // Versão do registro (enviada no If-Match ao salvar).
 }
 
 // Interface para um registro de log (histórico) de uma OS.
@@ -100,6 +102,7 @@ export interface OS {
     logs: OSLog[]; // Histórico de atividades da OS.
     attachmentsEnabled: boolean; // Flag para indicar se o envio de anexos está permitido.
     imageAttachments: ImageAttachment[]; // Array de imagens anexadas.
+    version?: number; // Versão do registro (enviada no If-Match ao salvar).
 }
 
 // Interface para uma notificação destinada a um usuário.